@@ -13,18 +13,21 @@ __date__ = "April 11, 2019"
 
 import logging
 import operator
-from copy import deepcopy
-from itertools import starmap
+from collections import defaultdict
+from copy import copy
+from multiprocessing import cpu_count
 from typing import TYPE_CHECKING, Callable
 
 import networkx as nx
 import numpy as np
+from joblib import Parallel, delayed
 from monty.json import MSONable
 
 from pymatgen.analysis.diffusion.neb.pathfinder import (
     ChgcarPotential,
     MigrationHop,
     NEBPathfinder,
+    _find_orbit_index,
 )
 from pymatgen.analysis.diffusion.neb.periodic_dijkstra import (
     get_optimal_pathway_rev,
@@ -43,31 +46,50 @@ if TYPE_CHECKING:
 
 logger = logging.getLogger(__name__)
 
+# Edge attributes that are always written out by get_summary_dict
+_HOP_KEYS = ("hop_label", "to_jimage", "ipos", "epos", "ipos_cart", "epos_cart")
 
-def generic_groupby(list_in: list, comp: Callable = operator.eq):
+
+def generic_groupby(
+    list_in: list, comp: Callable = operator.eq, key: Callable | None = None
+):
     """
     Group a list of unsortable objects
     Args:
         list_in: A list of generic objects
         comp: (Default value = operator.eq) The comparator
+        key: (Default value = None) A function that maps each object to a hashable
+            value, only objects with the same key are compared using comp. Objects
+            that comp considers equal must always share the same key.
     Returns:
         [int] list of labels for the input list
     """
-    list_out = [None] * len(list_in)
-    label_num = 0
-    for i1, ls1 in enumerate(list_out):
-        if ls1 is not None:
-            continue
-        list_out[i1] = label_num  # type: ignore
-        for i2, _ls2 in list(enumerate(list_out))[i1 + 1 :]:
-            if comp(list_in[i1], list_in[i2]):
-                if list_out[i2] is None:
-                    list_out[i2] = list_out[i1]
-                else:
-                    list_out[i1] = list_out[i2]
-                    label_num -= 1
-        label_num += 1
-    return list_out
+    buckets = defaultdict(list)
+    for idx, item in enumerate(list_in):
+        buckets[None if key is None else key(item)].append(idx)
+
+    # union-find over the indices, the root of each group is its smallest index
+    parent = list(range(len(list_in)))
+
+    def find(idx):
+        while parent[idx] != idx:
+            parent[idx] = parent[parent[idx]]
+            idx = parent[idx]
+        return idx
+
+    for members in buckets.values():
+        for n1, i1 in enumerate(members):
+            for i2 in members[n1 + 1 :]:
+                r1, r2 = find(i1), find(i2)
+                if r1 != r2 and comp(list_in[i1], list_in[i2]):
+                    parent[max(r1, r2)] = min(r1, r2)
+
+    # number the groups in the order of their first appearance
+    root_labels: dict[int, int] = {}
+    return [
+        root_labels.setdefault(find(idx), len(root_labels))
+        for idx in range(len(list_in))
+    ]
 
 
 class MigrationGraph(MSONable):
@@ -109,12 +131,20 @@ class MigrationGraph(MSONable):
         self.vac_mode = vac_mode
         if self.vac_mode:
             raise NotImplementedError("Vacancy mode is not yet implemented")
+        self._symm_structure = None
+        self._edges_by_length = None
         # Generate the graph edges between these all the sites
         self.m_graph.set_node_attributes()  # popagate the sites properties to the graph nodes
         # For poperies like unique_hops we might be interested in modifying them after creation
         # So let's not convert them into properties for now.  (Awaiting rewrite once the usage becomes more clear.)
+        # Coordinates of the migrating sites as contiguous arrays
+        self._frac_coords = np.ascontiguousarray(
+            self.only_sites.frac_coords, dtype=np.float64
+        )
+        self._cart_coords = np.dot(self._frac_coords, self.only_sites.lattice.matrix)
         self._populate_edges_with_migration_hops()
         self._group_and_label_hops()
+        self._index_edges()
 
     @property
     def only_sites(self) -> Structure:
@@ -145,25 +175,29 @@ class MigrationGraph(MSONable):
     def symm_structure(self) -> SymmetrizedStructure:
         """
         The symmetrized structure with the present item's symprec value
+        (the symmetry analysis is only performed on first access)
         """
-        a = SpacegroupAnalyzer(self.structure, symprec=self.symprec)
-        sym_struct = a.get_symmetrized_structure()
-        if not isinstance(sym_struct, SymmetrizedStructure):
-            raise RuntimeError("Symmetrized structure could not be generated.")
-        return sym_struct
+        if self._symm_structure is None:
+            a = SpacegroupAnalyzer(self.structure, symprec=self.symprec)
+            sym_struct = a.get_symmetrized_structure()
+            if not isinstance(sym_struct, SymmetrizedStructure):
+                raise RuntimeError("Symmetrized structure could not be generated.")
+            self._symm_structure = sym_struct
+        return self._symm_structure
 
     @property
     def unique_hops(self):
         """
         The unique hops dictionary keyed by the hop label
         """
-        # reversed so that the first instance represents the group of distinct hops
-        ihop_data = list(reversed(list(self.m_graph.graph.edges(data=True))))
-        for u, v, d in ihop_data:
+        unique_hops = {}
+        for u, v, d in self.m_graph.graph.edges(data=True):
             d["iindex"] = u
             d["eindex"] = v
             d["hop_distance"] = d["hop"].length
-        return {d["hop_label"]: d for u, v, d in ihop_data}
+            # the first instance represents the group of distinct hops
+            unique_hops.setdefault(d["hop_label"], d)
+        return unique_hops
 
     @classmethod
     def with_base_structure(
@@ -281,10 +315,8 @@ class MigrationGraph(MSONable):
         )
         res = []
         for group in l_base_and_inserted:
-            all_sites = group["base"].copy().sites
-            for isite in group["inserted"]:
-                all_sites.append(isite)
-            struct = Structure.from_sites(all_sites)
+            # from_sites creates new sites so the base structure does not need copying
+            struct = Structure.from_sites([*group["base"], *group["inserted"]])
             # make spglib ignore all magmoms
             for isite in struct.sites:
                 isite.properties.pop("magmom", None)
@@ -300,41 +332,122 @@ class MigrationGraph(MSONable):
           w (int): index for multiple edges that share the same two nodes
         """
         edge = self.m_graph.graph[u][v][w]
-        i_site = self.only_sites.sites[u]
-        e_site = PeriodicSite(
-            self.only_sites.sites[v].species,
-            self.only_sites.sites[v].frac_coords + np.array(edge["to_jimage"]),
-            lattice=self.only_sites.lattice,
-        )
+        lattice = self.only_sites.lattice
+        epos = self._frac_coords[v] + np.array(edge["to_jimage"])
         # Positions might be useful for plotting
-        edge["ipos"] = i_site.frac_coords
-        edge["epos"] = e_site.frac_coords
-        edge["ipos_cart"] = np.dot(i_site.frac_coords, self.only_sites.lattice.matrix)
-        edge["epos_cart"] = np.dot(e_site.frac_coords, self.only_sites.lattice.matrix)
+        edge["ipos"] = self._frac_coords[u]
+        edge["epos"] = epos
+        edge["ipos_cart"] = self._cart_coords[u]
+        edge["epos_cart"] = np.dot(epos, lattice.matrix)
 
+        e_site = PeriodicSite(self.only_sites.sites[v].species, epos, lattice=lattice)
         edge["hop"] = MigrationHop(
-            i_site, e_site, self.symm_structure, symprec=self.symprec
+            self.only_sites.sites[u], e_site, self.symm_structure, symprec=self.symprec
         )
 
     def _populate_edges_with_migration_hops(self):
         """
         Populate the edges with the data for the Migration Paths
         """
-        list(starmap(self._get_pos_and_migration_hop, self.m_graph.graph.edges))
+        edges = list(self.m_graph.graph.edges(keys=True, data=True))
+        if len(edges) == 0:
+            return
+        lattice = self.only_sites.lattice
+        sites = self.only_sites.sites
+
+        # positions of all the end points, computed together
+        us = [u for u, _v, _w, _d in edges]
+        vs = [v for _u, v, _w, _d in edges]
+        images = np.array([d["to_jimage"] for _u, _v, _w, d in edges])
+        ipos = self._frac_coords[us]
+        epos = self._frac_coords[vs] + images
+        ipos_cart = self._cart_coords[us]
+        epos_cart = self._cart_coords[vs] + np.dot(images, lattice.matrix)
+
+        symm_structure = self.symm_structure
+        for n, (u, v, _w, edge) in enumerate(edges):
+            e_site = PeriodicSite(sites[v].species, epos[n], lattice=lattice)
+            # Positions might be useful for plotting
+            edge["ipos"] = ipos[n]
+            edge["epos"] = epos[n]
+            edge["ipos_cart"] = ipos_cart[n]
+            edge["epos_cart"] = epos_cart[n]
+
+            edge["hop"] = MigrationHop(
+                sites[u], e_site, symm_structure, symprec=self.symprec
+            )
 
     def _group_and_label_hops(self):
         """
         Group the MigrationHop objects together and label all the symmetrically equlivaelnt hops with the same label
         """
-        hops = list(nx.get_edge_attributes(self.m_graph.graph, "hop").items())
-        labs = generic_groupby(hops, comp=lambda x, y: x[1] == y[1])
+        hops = [
+            ((u, v, k), hop)
+            for u, v, k, hop in self.m_graph.graph.edges(keys=True, data="hop")
+        ]
+        # equivalent hops must have the same length (see MigrationHop.__eq__) and
+        # connect the same groups of symmetrically equivalent sites
+        length_groups = _get_length_groups([hop.length for _, hop in hops])
+        keyed_hops = [
+            (hop, (l_group, _get_hop_signature(hop)))
+            for (_, hop), l_group in zip(hops, length_groups)
+        ]
+        labs = generic_groupby(
+            keyed_hops, comp=lambda x, y: x[0] == y[0], key=lambda x: x[1]
+        )
         new_attr = {
             g_index: {"hop_label": labs[edge_index]}
             for edge_index, (g_index, _) in enumerate(hops)
         }
         nx.set_edge_attributes(self.m_graph.graph, new_attr)
+
+        # reverse lookup of the edges that share the same label
+        self._edges_by_label = defaultdict(list)
+        for g_index, attr in new_attr.items():
+            self._edges_by_label[attr["hop_label"]].append(g_index)
         return new_attr
 
+    def _index_edges(self):
+        """
+        Store the (key, data) of each edge keyed by (u, v, to_jimage) with u <= v so
+        they can be looked up without going through the networkx graph, and the
+        length and to_jimage of all the edges as arrays
+        """
+        edges = list(self.m_graph.graph.edges(data=True, keys=True))
+        self._edge_index = {}
+        for u, v, k, d in edges:
+            self._edge_index[(*sorted((u, v)), tuple(d["to_jimage"]))] = (k, d)
+
+        # frequently read attributes as arrays, in the same order as self._edges
+        self._edges = [(u, v, d) for u, v, _k, d in edges]
+        self._edge_soa = {
+            "length": np.array([d["hop"].length for *_, d in edges], dtype=np.float64),
+            "to_jimage": np.array(
+                [d["to_jimage"] for *_, d in edges], dtype=np.int8
+            ).reshape(-1, 3),
+        }
+
+    def _get_edges_sorted_by_length(self):
+        """
+        Sorted array of the hop lengths of all the edges, computed on first use.
+        Returns:
+            sorted lengths, edge indices in the same order, list of (u, v, data),
+            (n_edges, 3, 3) array of the initial, end and middle frac_coords of the hops
+        """
+        if self._edges_by_length is None:
+            lengths = self._edge_soa["length"]
+            order = np.argsort(lengths, kind="stable")
+            hops = [d["hop"] for _, _, d in self._edges]
+            hop_pos = np.array(
+                [
+                    [h.isite.frac_coords, h.esite.frac_coords, h.msite.frac_coords]
+                    for h in hops
+                ],
+                dtype=np.float64,
+            ).reshape(-1, 3, 3)
+            self._edges_by_length = (lengths[order], order, self._edges, hop_pos)
+        return self._edges_by_length
+
     def add_data_to_similar_edges(
         self,
         target_label: int | str,
@@ -350,16 +463,17 @@ class MigrationGraph(MSONable):
             determine whether the data needs to be flipped so that 0-->1 is different from 1-->0
         """
 
-        for _u, _v, d in self.m_graph.graph.edges(data=True):
+        if m_hop is not None:
+            # the iindex of each edge's hop is the symmetry group of its initial site
+            # so the reference site only has to be classified once
+            m_hop_orbit = _get_orbit_index(m_hop.isite, m_hop.symm_structure)
+
+        for u, v, w in self._edges_by_label.get(target_label, []):
+            d = self.m_graph.graph[u][v][w]
             if d["hop_label"] == target_label:
                 d.update(data)
                 # Try to override the data.
-                if (
-                    m_hop is not None
-                    and not m_hop.symm_structure.spacegroup.are_symmetrically_equivalent(
-                        [m_hop.isite], [d["hop"].isite]
-                    )
-                ):
+                if m_hop is not None and d["hop"].iindex != m_hop_orbit:
                     # "The data going to this edge needs to be flipped"
                     for k in data:
                         if isinstance(data[k], (np.ndarray, np.generic)):
@@ -406,17 +520,29 @@ class MigrationGraph(MSONable):
                 f"There are {len(self.unique_hops)} SC hops but {len(self.unique_hops)} UC hops in {self}"
             )
 
+        def keep_edge(tmp_u, tmp_v, tmp_k):
+            return self.m_graph.graph[tmp_u][tmp_v][tmp_k]["cost"] <= max_val
+
+        # Trim the higher cost edges from the network without copying the graph
+        path_graph = nx.subgraph_view(self.m_graph.graph, filter_edge=keep_edge)
+
+        # A site can only reach one of its own periodic images if its connected component
+        # contains at least one hop that leaves the unit cell, other sources are skipped
+        leaves_cell = self._edge_soa["to_jimage"].any(axis=1)
+        crossing_nodes = {
+            tmp_u
+            for (tmp_u, _tmp_v, d), crossing in zip(self._edges, leaves_cell)
+            if crossing and d["cost"] <= max_val
+        }
+        periodic_nodes = set()
+        for component in nx.weakly_connected_components(path_graph):
+            if not component.isdisjoint(crossing_nodes):
+                periodic_nodes |= component
+
         # for u, v, k, d in self.m_graph.graph.edges(data=True, keys=True):
         for u in self.m_graph.graph.nodes():
-            # Create a copy of the graph so that we can trim the higher cost hops
-            path_graph = deepcopy(self.m_graph.graph)
-            # Trim the higher cost edges from the network
-            cut_edges = []
-            for tmp_u, tmp_v, tmp_k, tmp_d in path_graph.edges(data=True, keys=True):
-                if tmp_d["cost"] > max_val:
-                    cut_edges.append((tmp_u, tmp_v, tmp_k))
-            for tmp_u, tmp_v, tmp_k in cut_edges:
-                path_graph.remove_edge(tmp_u, tmp_v, key=tmp_k)
+            if u not in periodic_nodes:
+                continue
             # populate the entire graph with multiple images
             best_ans, path_parent = periodic_dijkstra(
                 path_graph, sources={u}, weight="cost", max_image=2
@@ -443,17 +569,20 @@ class MigrationGraph(MSONable):
                 # displacement +/- (jimage1 - jimage2) is present on of of the edges
                 # Note: there should only ever be one valid to_jimage for a u->v pair
                 i1_, i2_ = sorted((idx1, idx2))
-                all_edge_data = [
-                    *path_graph.get_edge_data(i1_, i2_, default={}).items()
-                ]
-                image_diff = np.subtract(jimage2, jimage1)
-                found_ = 0
-                for _k, tmp_d in all_edge_data:
-                    if tmp_d["to_jimage"] in {tuple(image_diff), tuple(-image_diff)}:
-                        path_hops.append(tmp_d)
-                        found_ += 1
-                if found_ != 1:
+                image_diff = tuple(j2_ - j1_ for j1_, j2_ in zip(jimage1, jimage2))
+                # a zero image difference is its own negation, only look it up once
+                candidate_jimages: tuple = (image_diff,)
+                if any(image_diff):
+                    candidate_jimages += (tuple(-j_ for j_ in image_diff),)
+                found_ = []
+                for tmp_jimage in candidate_jimages:
+                    tmp_edge = self._edge_index.get((i1_, i2_, tmp_jimage))
+                    if tmp_edge is not None and tmp_edge[1]["cost"] <= max_val:
+                        found_.append(tmp_edge[1])
+                if len(found_) != 1:
                     raise RuntimeError("More than one edge matched in original graph.")
+                # shallow copy so the edges of the graph are not modified downstream
+                path_hops.append(dict(found_[0]))
             if flip_hops is True:  # flip hops in path to form coherent pathway
                 yield u, order_path(path_hops, u)
             else:
@@ -463,28 +592,21 @@ class MigrationGraph(MSONable):
         """
         Dictionary format, for saving to database
         """
-        hops = []
-        keys = ["hop_label", "to_jimage", "ipos", "epos", "ipos_cart", "epos_cart"]
-
-        if added_keys is not None:
-            keys += added_keys
-
-        def get_keys(d):
-            return {k_: d[k_] for k_ in keys if k_ in d}
+        keys = _HOP_KEYS if added_keys is None else (*_HOP_KEYS, *added_keys)
 
+        hops = []
         for u, v, d in self.m_graph.graph.edges(data=True):
-            new_hop = get_keys(d)
+            new_hop = {k_: d[k_] for k_ in keys if k_ in d}
             new_hop["iindex"] = u
             new_hop["eindex"] = v
             hops.append(new_hop)
 
         unique_hops = []
-        for d in self.unique_hops.values():
+        for _label, d in sorted(self.unique_hops.items()):
+            new_hop = {k_: d[k_] for k_ in keys if k_ in d}
             new_hop["iindex"] = d["iindex"]
             new_hop["eindex"] = d["eindex"]
-            unique_hops.append(get_keys(d))
-
-        unique_hops = sorted(unique_hops, key=lambda x: x["hop_label"])
+            unique_hops.append(new_hop)
 
         return dict(
             structure=self.structure.as_dict(),
@@ -526,15 +648,11 @@ class ChargeBarrierGraph(MigrationGraph):
     def _setup_grids(self):
         """Populate the internal variables used for defining the grid points in the charge density analysis"""
 
-        # set up the grid
-        aa = np.linspace(
-            0, 1, len(self.potential_field.get_axis_grid(0)), endpoint=False
-        )
-        bb = np.linspace(
-            0, 1, len(self.potential_field.get_axis_grid(1)), endpoint=False
-        )
-        cc = np.linspace(
-            0, 1, len(self.potential_field.get_axis_grid(2)), endpoint=False
+        # set up the grid in the precision of the charge density
+        dtype = self.potential_field.data[self.potential_data_key].dtype
+        aa, bb, cc = (
+            np.linspace(0, 1, n_pts, endpoint=False, dtype=dtype)
+            for n_pts in self.potential_field.dim
         )
         # move the grid points to the center
         aa, bb, dd = map(_shift_grid, [aa, bb, cc])
@@ -549,27 +667,59 @@ class ChargeBarrierGraph(MigrationGraph):
 
         # store these
         self._uc_grid_shape = AA.shape
-        self._fcoords = np.vstack([AA.flatten(), BB.flatten(), CC.flatten()]).T
-        self._images = np.vstack([IMA.flatten(), IMB.flatten(), IMC.flatten()]).T
+        # row-major (N, 3) arrays so that each point is contiguous in memory
+        self._fcoords = np.column_stack([AA.ravel(), BB.ravel(), CC.ravel()])
+        self._images = np.column_stack([IMA.ravel(), IMB.ravel(), IMC.ravel()])
+        # the sphere averages use the grid shifted along all three axes
+        AA, BB, DD = np.meshgrid(aa, bb, dd, indexing="ij")
+        self._shifted_fcoords = np.column_stack([AA.ravel(), BB.ravel(), DD.ravel()])
+
+        # cartesian versions of the grid points and the periodic images
+        lattice_matrix = self.potential_field.structure.lattice.matrix
+        self._cart_grid = np.dot(self._fcoords, lattice_matrix)
+        self._cart_images = np.dot(self._images, lattice_matrix)
 
     def _dist_mat(self, pos_frac):
         # return a matrix that contains the distances to pos_frac
-        aa = np.linspace(
-            0, 1, len(self.potential_field.get_axis_grid(0)), endpoint=False
-        )
-        bb = np.linspace(
-            0, 1, len(self.potential_field.get_axis_grid(1)), endpoint=False
-        )
-        cc = np.linspace(
-            0, 1, len(self.potential_field.get_axis_grid(2)), endpoint=False
-        )
-        aa, bb, cc = map(_shift_grid, [aa, bb, cc])
-        AA, BB, CC = np.meshgrid(aa, bb, cc, indexing="ij")
         dist_from_pos = self.potential_field.structure.lattice.get_all_distances(
-            fcoords1=np.vstack([AA.flatten(), BB.flatten(), CC.flatten()]).T,
+            fcoords1=self._shifted_fcoords,
             fcoords2=pos_frac,
         )
-        return dist_from_pos.reshape(AA.shape)
+        return dist_from_pos.reshape(self._uc_grid_shape)
+
+    def _get_grid_indices_in_sphere(self, pos_frac, radius):
+        """
+        Flat indices of the points of the _dist_mat grid that are closer than radius
+        to pos_frac, only the points in the bounding box of the sphere are checked.
+        Args:
+            pos_frac: fractional coordinates of the center of the sphere
+            radius: radius of the sphere
+        Returns:
+            array of indices into the flattened charge density grid
+        """
+        lattice = self.potential_field.structure.lattice
+        dims = np.array(self._uc_grid_shape)
+        pos_frac = np.asarray(pos_frac, dtype=np.float64)
+        # half width of the sphere along each fractional axis
+        half_width = radius * np.linalg.norm(lattice.inv_matrix, axis=0)
+        # grid point j along an axis of n points sits at (j + 0.5) / n
+        lo = np.floor((pos_frac - half_width) * dims - 0.5).astype(int)
+        hi = np.ceil((pos_frac + half_width) * dims - 0.5).astype(int)
+        if np.any(hi - lo + 1 > dims):
+            # the box wraps onto itself, use the minimum image of the whole grid
+            return np.flatnonzero(self._dist_mat(pos_frac) < radius)
+
+        axes = [np.arange(lo_, hi_ + 1) for lo_, hi_ in zip(lo, hi)]
+        frac_diffs = [(ax + 0.5) / n - p for ax, n, p in zip(axes, dims, pos_frac)]
+        cart_diff = (
+            frac_diffs[0][:, None, None, None] * lattice.matrix[0]
+            + frac_diffs[1][None, :, None, None] * lattice.matrix[1]
+            + frac_diffs[2][None, None, :, None] * lattice.matrix[2]
+        )
+        in_sphere = np.einsum("abci,abci->abc", cart_diff, cart_diff) < radius**2
+        ia, ib, ic = (ax % n for ax, n in zip(axes, dims))
+        flat_idx = (ia[:, None, None] * dims[1] + ib[None, :, None]) * dims[2] + ic
+        return flat_idx[in_sphere]
 
     def _get_pathfinder_from_hop(self, migration_hop: MigrationHop, n_images=20):
         # get migration pathfinder objects which contains the paths
@@ -619,25 +769,21 @@ class ChargeBarrierGraph(MigrationGraph):
         Returns:
             [float]: maximum of the charge density, (optional: entire list of charge density)
         """
-        if radius is None:
-            rr = self._tube_radius
+        rr = self._tube_radius if radius is None else radius
         if rr <= 0:
             raise ValueError("The integration radius must be positive.")
 
         npf = self._get_pathfinder_from_hop(migration_hop)
+        chg_flat = self.potential_field.data[self.potential_data_key].ravel()
         # get the charge in a sphere around each point
         centers = [image.sites[0].frac_coords for image in npf.images]
         avg_chg = []
         for ict in centers:
-            dist_mat = self._dist_mat(ict)
-            mask = dist_mat < rr
-            vol_sphere = self.potential_field.structure.volume * (
-                mask.sum() / self.potential_field.ngridpts
-            )
+            # only gather the grid points inside the sphere
+            in_sphere = chg_flat[self._get_grid_indices_in_sphere(ict, rr)]
+            # (sum / ngridpts) / (volume * n_in / ngridpts)
             avg_chg.append(
-                np.sum(self.potential_field.data[self.potential_data_key] * mask)
-                / self.potential_field.ngridpts
-                / vol_sphere
+                in_sphere.sum() / self.potential_field.structure.volume / in_sphere.size
             )
         if output_positions:
             return max(avg_chg), avg_chg, centers
@@ -666,26 +812,31 @@ class ChargeBarrierGraph(MigrationGraph):
 
         cart_ipos = np.dot(ipos, self.potential_field.structure.lattice.matrix)
         cart_epos = np.dot(epos, self.potential_field.structure.lattice.matrix)
-        pbc_mask = np.zeros(self._uc_grid_shape, dtype=bool).flatten()
-        for img in self._images:
-            grid_pos = np.dot(
-                self._fcoords + img, self.potential_field.structure.lattice.matrix
-            )
-            proj_on_line = np.dot(grid_pos - cart_ipos, cart_epos - cart_ipos) / (
-                np.linalg.norm(cart_epos - cart_ipos)
+        hop_len = np.linalg.norm(cart_epos - cart_ipos)
+        hop_dir = (cart_epos - cart_ipos) / hop_len
+        sq_radius = self._tube_radius**2
+
+        # For a grid point g (relative to ipos) shifted by the image vector c:
+        #   proj = g.u + c.u  and  |g + c|^2 = |g|^2 + 2 g.c + |c|^2
+        # so the image independent parts are only computed once per hop
+        grid_pos = self._cart_grid - cart_ipos
+        grid_proj = np.dot(grid_pos, hop_dir)
+        grid_sq = np.sum(grid_pos**2, axis=1)
+
+        pbc_mask = np.zeros(len(grid_pos), dtype=bool)
+        for cart_img in self._cart_images:
+            proj_on_line = grid_proj + np.dot(cart_img, hop_dir)
+            sq_dist_to_line = (
+                grid_sq
+                + 2 * np.dot(grid_pos, cart_img)
+                + np.dot(cart_img, cart_img)
+                - proj_on_line**2
             )
-            dist_to_line = np.linalg.norm(
-                np.cross(grid_pos - cart_ipos, cart_epos - cart_ipos)
-                / (np.linalg.norm(cart_epos - cart_ipos)),
-                axis=-1,
-            )
-
-            mask = (
+            pbc_mask |= (
                 (proj_on_line >= 0)
-                * (proj_on_line < np.linalg.norm(cart_epos - cart_ipos))
-                * (dist_to_line < self._tube_radius)
+                & (proj_on_line < hop_len)
+                & (sq_dist_to_line < sq_radius)
             )
-            pbc_mask = pbc_mask + mask
         pbc_mask = pbc_mask.reshape(self._uc_grid_shape)
 
         if mask_file_seedname:
@@ -708,21 +859,45 @@ class ChargeBarrierGraph(MigrationGraph):
             / self.potential_field.structure.volume
         )
 
-    def populate_edges_with_chg_density_info(self, tube_radius=1):
+    def _get_chg_info_of_hop(self, migration_hop):
+        """
+        Charge density analysis of a single hop, this only reads the potential field
+        Args:
+            migration_hop: MigrationHop object that represents a given hop
+        Returns:
+            charge in the tube, max average charge in the spheres,
+            average charge of each sphere, position of each sphere
+        """
+        # charge in tube
+        chg_tot = self._get_chg_between_sites_tube(migration_hop)
+        # max charge in sphere
+        max_chg, avg_chg_list, frac_coords_list = self._get_avg_chg_at_max(
+            migration_hop, chg_along_path=True, output_positions=True
+        )
+        return chg_tot, max_chg, avg_chg_list, frac_coords_list
+
+    def populate_edges_with_chg_density_info(self, tube_radius=1, n_jobs=None):
         """
         Args:
             tube_radius: Tube radius.
+            n_jobs (int): number of threads used to analyze the unique hops,
+                defaults to 1. A negative value uses all the CPUs.
         """
         self._tube_radius = tube_radius
-        for k, v in self.unique_hops.items():
-            # charge in tube
-            chg_tot = self._get_chg_between_sites_tube(v["hop"])
+        if n_jobs is None:
+            n_jobs = 1
+        if n_jobs < 0:
+            n_jobs = cpu_count()
+
+        # The analysis is dominated by NumPy operations on the grid which release the
+        # GIL, the graph is only modified once all the hops are done
+        unique_hops = self.unique_hops
+        all_chg_info = Parallel(n_jobs=n_jobs, prefer="threads")(
+            delayed(self._get_chg_info_of_hop)(v["hop"]) for v in unique_hops.values()
+        )
+        for (k, v), chg_info in zip(unique_hops.items(), all_chg_info):
+            chg_tot, max_chg, avg_chg_list, frac_coords_list = chg_info
             self.add_data_to_similar_edges(k, {"chg_total": chg_tot})
-
-            # max charge in sphere
-            max_chg, avg_chg_list, frac_coords_list = self._get_avg_chg_at_max(
-                v["hop"], chg_along_path=True, output_positions=True
-            )
             images = [
                 {"position": ifrac, "average_charge": ichg}
                 for ifrac, ichg in zip(frac_coords_list, avg_chg_list)
@@ -742,17 +917,27 @@ class ChargeBarrierGraph(MigrationGraph):
         Returns:
             list of hops
         """
-        min_chg = 100000000
-        min_path = []
-        all_paths = self.get_path()
-        for path in all_paths:
-            sum_chg = np.sum([hop[2]["chg_total"] for hop in path])
-            sum_length = np.sum([hop[2]["hop"].length for hop in path])
-            avg_chg = sum_chg / sum_length
-            if avg_chg < min_chg:
-                min_chg = sum_chg
-                min_path = path
-        return min_path
+        all_paths = [path for _u, path in self.get_path()]
+        if len(all_paths) == 0:
+            return []
+
+        # values of all the hops in flat arrays, each path is a contiguous segment
+        # (the hop dicts are copies of the edge data and carry chg_total)
+        path_lengths = np.array([len(path) for path in all_paths])
+        offsets = np.concatenate([[0], np.cumsum(path_lengths[:-1])])
+        n_hops = int(path_lengths.sum())
+        chg = np.fromiter(
+            (hop["chg_total"] for path in all_paths for hop in path),
+            dtype=np.float64,
+            count=n_hops,
+        )
+        length = np.fromiter(
+            (hop["hop"].length for path in all_paths for hop in path),
+            dtype=np.float64,
+            count=n_hops,
+        )
+        avg_chg = np.add.reduceat(chg, offsets) / np.add.reduceat(length, offsets)
+        return all_paths[int(np.argmin(avg_chg))]
 
     def get_summary_dict(self, add_keys: list[str] | None = None):
         """
@@ -776,23 +961,75 @@ def get_only_sites_from_structure(
     Returns:
       Structure: Structure with all possible migrating ion sites
     """
-    migrating_ion_sites = list(
-        filter(
-            lambda site: site.species == Composition({migrating_specie: 1}),
-            structure.sites,
-        )
-    )
+    migrating_comp = Composition({migrating_specie: 1})
+    migrating_ion_sites = [site for site in structure if site.species == migrating_comp]
     return Structure.from_sites(migrating_ion_sites)
 
 
+def _get_length_groups(lengths: list[float], tol: float = 1e-3) -> list[int]:
+    """
+    Chain the lengths that are within tol of their neighbour in sorted order, so any
+    two lengths that differ by at most tol end up in the same group.
+    Args:
+        lengths: The lengths to group
+        tol: The tolerance used by MigrationHop.__eq__
+    Returns:
+        [int] group index of each length, in the input order
+    """
+    order = sorted(range(len(lengths)), key=lengths.__getitem__)
+    groups = [0] * len(lengths)
+    group = 0
+    for prev, cur in zip(order, order[1:]):
+        if lengths[cur] - lengths[prev] > tol:
+            group += 1
+        groups[cur] = group
+    return groups
+
+
+def _get_hop_signature(hop: MigrationHop) -> tuple:
+    """
+    Hashable value that is shared by all the hops that are equivalent to the given hop.
+    The length is left out since it is grouped separately by _get_length_groups.
+    Args:
+        hop: The MigrationHop object
+    Returns:
+        sorted (iindex, eindex)
+    """
+    return tuple(sorted((hop.iindex, hop.eindex)))
+
+
+def _get_orbit_index(site: PeriodicSite, symm_structure: SymmetrizedStructure):
+    """
+    Find the group of symmetrically equivalent sites that a site belongs to, using
+    the same convention as the iindex and eindex of MigrationHop.
+    Args:
+        site: The site to classify
+        symm_structure: The symmetrized structure defining the groups
+    Returns:
+        int: index of the group in symm_structure.equivalent_sites
+    """
+    # sites of the structure (or their periodic images) are looked up directly
+    frac_diff = symm_structure.frac_coords - site.frac_coords
+    frac_diff -= np.round(frac_diff)
+    matches = np.flatnonzero(np.all(np.abs(frac_diff) < 1e-3, axis=1))
+    if len(matches) > 0:
+        for i, indices in enumerate(symm_structure.equivalent_indices):
+            if matches[0] in indices:
+                return i
+
+    return _find_orbit_index(site, symm_structure, symm_structure.spacegroup)
+
+
 def _shift_grid(vv):
     """
     Move the grid points by half a step so that they sit in the center
     Args:
         vv: equally space grid points in 1-D
+    Returns:
+        shifted grid points with the same dtype as vv
     """
     step = vv[1] - vv[0]
-    return vv + step / 2.0
+    return (vv + step * 0.5).astype(vv.dtype, copy=False)
 
 
 def get_hop_site_sequence(
@@ -807,28 +1044,21 @@ def get_hop_site_sequence(
     Returns:
         String representation of the hop sequence (and property values if any)
     """
-    hops = iter(hop_list)
-    ihop = next(hops)
-    site_seq = (
-        [ihop["eindex"], ihop["iindex"]]
-        if ihop["eindex"] == start_u
-        else [ihop["iindex"], ihop["eindex"]]
-    )
-
-    for ihop in hops:
-        if ihop["iindex"] == site_seq[-1]:
-            site_seq.append(ihop["eindex"])
-        elif ihop["eindex"] == site_seq[-1]:
-            site_seq.append(ihop["iindex"])
+    ends = [(ihop["iindex"], ihop["eindex"]) for ihop in hop_list]
+    i0, e0 = ends[0]
+    site_seq = [e0, i0] if e0 == start_u else [i0, e0]
+
+    for i_, e_ in ends[1:]:
+        last = site_seq[-1]
+        if i_ == last:
+            site_seq.append(e_)
+        elif e_ == last:
+            site_seq.append(i_)
         else:
             raise RuntimeError("The sequence of sites for the path is invalid.")
 
     if key is not None:
-        key_seq = []
-        hops = iter(hop_list)
-        for ihop in hops:
-            key_seq.append(ihop[key])
-        return [site_seq, key_seq]
+        return [site_seq, [ihop[key] for ihop in hop_list]]
 
     return site_seq
 
@@ -854,19 +1084,17 @@ def order_path(hop_list: list[dict], start_u: int | str) -> list[dict]:
         if n == hop["iindex"]:  # don't flip hop
             ordered_path.append(hop)
         else:
-            # create flipped hop
-            fh = MigrationHop(
-                isite=hop["hop"].esite,
-                esite=hop["hop"].isite,
-                symm_structure=hop["hop"].symm_structure,
-                host_symm_struct=None,
-                symprec=hop["hop"].symprec,
-            )
+            # create flipped hop, the symmetry analysis of the original hop is reused
+            # since the midpoint and the symmetry groups of the end points do not change
+            fh = copy(hop["hop"])
+            fh.isite = hop["hop"].esite
+            fh.esite = hop["hop"].isite
+            fh.host_symm_struct = None
             # must manually set iindex and eindex
             fh.iindex = hop["hop"].eindex
             fh.eindex = hop["hop"].iindex
             fhd = {
-                "to_jimage": tuple(-1 * i for i in hop["to_jimage"]),
+                "to_jimage": tuple(-i for i in hop["to_jimage"]),
                 "ipos": fh.isite.frac_coords,
                 "epos": fh.esite.frac_coords,
                 "ipos_cart": fh.isite.coords,
@@ -902,18 +1130,63 @@ migration events using the following procedure:
 
 # Utility Functions for comparing UC and SC hops
 
+# Lattice translations between the unit cell and the 2x2x2 supercell
+_DIRECTIONS = np.array(
+    [
+        [0, 0, 0],
+        [1, 0, 0],
+        [0, 1, 0],
+        [0, 0, 1],
+        [0, 1, 1],
+        [1, 0, 1],
+        [1, 1, 0],
+        [1, 1, 1],
+    ]
+)
+
 
-def almost(a, b):
+def almost(a, b, tol=1e-4):
     """
-    return true if the values are almost equal
+    return true if the values (scalars or arrays of the same shape) are almost equal
+    """
+    return np.abs(np.asarray(a, dtype=float) - np.asarray(b, dtype=float)).max() < tol
+
+
+def _match_hop(uc_ipos, uc_epos, uc_mpos, sc_ipos, sc_epos, sc_mpos, tol=1e-4):
     """
-    SMALL_VAL = 1e-4
-    try:
-        return all(almost(i, j) for i, j in zip(list(a), list(b)))
-    except BaseException:
-        if isinstance(a, (int, float)) and isinstance(b, (int, float)):
-            return abs(a - b) < SMALL_VAL
-        raise NotImplementedError
+    Look for the lattice translation that maps the end points of a UC hop onto the
+    end points of a SC hop, all positions are given in units of the UC lattice.
+
+    Args:
+        uc_ipos, uc_epos, uc_mpos: Initial, end and middle positions of the UC hop
+        sc_ipos, sc_epos, sc_mpos: Initial, end and middle positions of the SC hop
+        tol: Tolerance for the fractional coordinates
+
+    Return:
+        index of the translation in _DIRECTIONS (-1 if there is no match)
+        Is the UC hop flip of the SC hop
+    """
+    m_match = np.all(np.abs(uc_mpos + _DIRECTIONS - sc_mpos) < tol, axis=1)
+    if not m_match.any():
+        return -1, False
+    tmp_i = uc_ipos + _DIRECTIONS
+    tmp_e = uc_epos + _DIRECTIONS
+    same = (
+        m_match
+        & np.all(np.abs(tmp_i - sc_ipos) < tol, axis=1)
+        & np.all(np.abs(tmp_e - sc_epos) < tol, axis=1)
+    )
+    flipped = (
+        m_match
+        & np.all(np.abs(tmp_e - sc_ipos) < tol, axis=1)
+        & np.all(np.abs(tmp_i - sc_epos) < tol, axis=1)
+    )
+    # first matching direction wins, unflipped before flipped
+    hits = np.flatnonzero(same | flipped)
+    if hits.size == 0:
+        return -1, False
+    idx = int(hits[0])
+    return idx, not same[idx]
 
 
 def check_uc_hop(sc_hop, uc_hop):
@@ -929,38 +1202,17 @@ def check_uc_hop(sc_hop, uc_hop):
         image vector of length 3
         Is the UC hop flip of the SC hop
     """
-
-    directions = np.array(
-        [
-            [0, 0, 0],
-            [1, 0, 0],
-            [0, 1, 0],
-            [0, 0, 1],
-            [0, 1, 1],
-            [1, 0, 1],
-            [1, 1, 0],
-            [1, 1, 1],
-        ]
+    idx, flip = _match_hop(
+        uc_hop.isite.frac_coords,
+        uc_hop.esite.frac_coords,
+        uc_hop.msite.frac_coords,
+        sc_hop.isite.frac_coords * 2,
+        sc_hop.esite.frac_coords * 2,
+        sc_hop.msite.frac_coords * 2,
     )
-
-    sc_ipos = [icoord * 2 for icoord in sc_hop.isite.frac_coords]
-    sc_epos = [icoord * 2 for icoord in sc_hop.esite.frac_coords]
-    sc_mpos = [icoord * 2 for icoord in sc_hop.msite.frac_coords]
-
-    uc_ipos = uc_hop.isite.frac_coords
-    uc_epos = uc_hop.esite.frac_coords
-    uc_mpos = uc_hop.msite.frac_coords
-
-    for idir in directions:
-        tmp_m = uc_mpos + idir
-        if almost(tmp_m, sc_mpos):
-            tmp_i = uc_ipos + idir
-            tmp_e = uc_epos + idir
-            if almost(tmp_i, sc_ipos) and almost(tmp_e, sc_epos):
-                return idir, False
-            if almost(tmp_e, sc_ipos) and almost(tmp_i, sc_epos):
-                return idir, True
-    return None
+    if idx < 0:
+        return None
+    return _DIRECTIONS[idx], flip
 
 
 def map_hop_sc2uc(sc_hop: MigrationHop, mg: MigrationGraph):
@@ -976,16 +1228,57 @@ def map_hop_sc2uc(sc_hop: MigrationHop, mg: MigrationGraph):
         the UC hop might be (0.9,0,0)-->(0.1,0,0)[img:100]
         for the inverse of (0.1,0,0)-->(-0.1,0,0) the code needs to account for both those cases
     """
-    for u, v, d in mg.m_graph.graph.edges(data=True):
-        chk_res = check_uc_hop(sc_hop=sc_hop, uc_hop=d["hop"])
-        if chk_res is not None:
-            assert almost(d["hop"].length, sc_hop.length)
+    # SC positions in units of the UC lattice, the same for every edge
+    sc_ipos = sc_hop.isite.frac_coords * 2
+    sc_epos = sc_hop.esite.frac_coords * 2
+    sc_mpos = sc_hop.msite.frac_coords * 2
+
+    # only edges of the same length can match, check them in the graph order
+    lengths, order, edges, hop_pos = mg._get_edges_sorted_by_length()
+    lo, hi = np.searchsorted(lengths, [sc_hop.length - 1e-4, sc_hop.length + 1e-4])
+    candidates = np.sort(order[lo:hi])
+
+    # middle points of all the candidates under all the translations in one array
+    cand_mpos = hop_pos[candidates, 2][:, np.newaxis, :] + _DIRECTIONS
+    m_match = np.all(np.abs(cand_mpos - sc_mpos) < 1e-4, axis=2).any(axis=1)
+    for i_edge in candidates[m_match]:
+        u, v, d = edges[i_edge]
+        uc_hop = d["hop"]
+        uc_ipos, uc_epos, uc_mpos = hop_pos[i_edge]
+        idx, flip = _match_hop(uc_ipos, uc_epos, uc_mpos, sc_ipos, sc_epos, sc_mpos)
+        if idx >= 0:
+            assert almost(uc_hop.length, sc_hop.length)
             return dict(
                 uc_u=u,
                 uc_v=v,
-                hop=d["hop"],
-                shift=chk_res[0],
-                flip=chk_res[1],
+                hop=uc_hop,
+                shift=_DIRECTIONS[idx],
+                flip=flip,
                 hop_label=d["hop_label"],
             )
     raise AssertionError("Looking for a SC hop without a matching UC hop")
+
+
+def map_hops_sc2uc(
+    sc_hops: list[MigrationHop], mg: MigrationGraph, n_jobs: int | None = None
+) -> list[dict]:
+    """
+    Map a list of hops in the SC onto the UC, see map_hop_sc2uc.
+    Args:
+        sc_hops: list of MigrationHop objects in the SC.
+        mg: MigrationGraph object of the UC.
+        n_jobs (int): number of threads used to map the hops, defaults to 1.
+            A negative value uses all the CPUs.
+    Returns:
+        list of the dicts returned by map_hop_sc2uc, in the order of sc_hops
+    """
+    if n_jobs is None:
+        n_jobs = 1
+    if n_jobs < 0:
+        n_jobs = cpu_count()
+
+    # build the shared edge cache before the threads start reading it
+    mg._get_edges_sorted_by_length()
+    return Parallel(n_jobs=n_jobs, prefer="threads")(
+        delayed(map_hop_sc2uc)(sc_hop, mg) for sc_hop in sc_hops
+    )
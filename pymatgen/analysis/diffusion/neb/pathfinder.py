@@ -322,6 +322,31 @@ class IDPPSolver:
         return np.array(total_forces)
 
 
+def _find_orbit_index(site: Site, symm_structure: SymmetrizedStructure, sg):
+    """
+    Find the group of symmetrically equivalent sites that a site belongs to.
+    Args:
+        site: The site to classify
+        symm_structure: The symmetrized structure defining the groups
+        sg: The spacegroup used to test for equivalence
+    Returns:
+        int: index of the group in symm_structure.equivalent_sites, or None if the
+        site is not equivalent to any of them
+    """
+    orbit_index = None
+    for i, sites in enumerate(symm_structure.equivalent_sites):
+        if sg.are_symmetrically_equivalent([site], [sites[0]]):
+            orbit_index = i
+    if orbit_index is not None:
+        return orbit_index
+
+    # if no index was identified then loop over each site until something is found
+    for i, sites in enumerate(symm_structure.equivalent_sites):
+        if any(sg.are_symmetrically_equivalent([site], [itr]) for itr in sites):
+            return i
+    return None
+
+
 class MigrationHop(MSONable):
     """
     A convenience container representing a migration path.
@@ -360,31 +385,8 @@ class MigrationHop(MSONable):
             if host_symm_struct
             else self.symm_structure.spacegroup  # type: ignore[union-attr]
         )
-        for i, sites in enumerate(self.symm_structure.equivalent_sites):
-            if sg.are_symmetrically_equivalent([isite], [sites[0]]):
-                self.iindex = i
-            if sg.are_symmetrically_equivalent([esite], [sites[0]]):
-                self.eindex = i
-
-        # if no index was identified then loop over each site until something is found
-        if self.iindex is None:
-            for i, sites in enumerate(self.symm_structure.equivalent_sites):
-                for itr_site in sites:
-                    if sg.are_symmetrically_equivalent([isite], [itr_site]):
-                        self.iindex = i
-                        break
-                else:
-                    continue
-                break
-        if self.eindex is None:
-            for i, sites in enumerate(self.symm_structure.equivalent_sites):
-                for itr_site in sites:
-                    if sg.are_symmetrically_equivalent([esite], [itr_site]):
-                        self.eindex = i
-                        break
-                else:
-                    continue
-                break
+        self.iindex = _find_orbit_index(isite, self.symm_structure, sg)
+        self.eindex = _find_orbit_index(esite, self.symm_structure, sg)
 
         if self.iindex is None:
             raise RuntimeError(
@@ -16,8 +16,6 @@ import math
 from collections import defaultdict
 from typing import TYPE_CHECKING, Callable
 
-import numpy as np
-
 if TYPE_CHECKING:
     from networkx.classes.graph import Graph
 
@@ -54,7 +52,7 @@ def _get_adjacency_with_images(G: Graph) -> dict:
         for v, value2 in value1.items():
             for d in value2.values():
                 if u > v:
-                    d["to_jimage"] = tuple(np.multiply(-1, d["to_jimage"]))
+                    d["to_jimage"] = tuple(-i_ for i_ in d["to_jimage"])
     return p_graph
 
 
@@ -86,8 +84,9 @@ def periodic_dijkstra(
 
     conn_dict = _get_adjacency_with_images(G.to_undirected())
 
-    # use a default dict since we don't know how far out to search
-    best_ans = defaultdict(lambda: math.inf)  # type: ignore
+    # we don't know how far out to search, unvisited nodes have an infinite cost
+    # (a plain dict in the loop, wrapped in a default dict for the callers)
+    best_ans: dict = {}
 
     path_parent = {}  # the parent of the current node in the optimal path
     pq = []  # type: ignore
@@ -96,13 +95,14 @@ def periodic_dijkstra(
     while pq:
         min_val, (cur_idx, cur_image) = heapq.heappop(pq)
         if target_reached(cur_idx, cur_image):
-            return best_ans
-        if min_val < best_ans[(cur_idx, cur_image)]:
+            return defaultdict(lambda: math.inf, best_ans)
+        if min_val < best_ans.get((cur_idx, cur_image), math.inf):
             best_ans[(cur_idx, cur_image)] = min_val
         for next_node, keyed_data in conn_dict[cur_idx].items():
             for d in keyed_data.values():
                 # get the node index, image pair
-                new_image = tuple(np.add(cur_image, d["to_jimage"]))
+                # (plain integer tuples, NumPy calls on 3-vectors dominate this loop)
+                new_image = tuple(i_ + j_ for i_, j_ in zip(cur_image, d["to_jimage"]))
                 next_index_pair = (next_node, new_image)
 
                 if any(abs(i_) > max_image for i_ in new_image):
@@ -110,12 +110,12 @@ def periodic_dijkstra(
 
                 new_cost = min_val + d[weight]
 
-                if new_cost < best_ans[next_index_pair]:
+                if new_cost < best_ans.get(next_index_pair, math.inf):
                     best_ans[next_index_pair] = new_cost
                     path_parent[next_index_pair] = (cur_idx, cur_image)
                     heapq.heappush(pq, (new_cost, next_index_pair))
 
-    return best_ans, path_parent
+    return defaultdict(lambda: math.inf, best_ans), path_parent
 
 
 def periodic_dijkstra_on_sgraph(
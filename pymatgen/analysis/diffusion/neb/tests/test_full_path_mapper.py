@@ -6,12 +6,15 @@ import os
 import unittest
 
 import numpy as np
+from joblib import Parallel, delayed
 from monty.serialization import loadfn
 
 from pymatgen.analysis.diffusion.neb.full_path_mapper import (
     ChargeBarrierGraph,
     MigrationGraph,
     MigrationHop,
+    _get_length_groups,
+    generic_groupby,
     get_hop_site_sequence,
     order_path,
 )
@@ -26,6 +29,36 @@ __version__ = "1.0"
 __date__ = "April 10, 2019"
 
 
+class GenericGroupbyTest(unittest.TestCase):
+    def test_generic_groupby(self):
+        assert generic_groupby([1, 2, 1, 3, 2, 1]) == [0, 1, 0, 2, 1, 0]
+        assert generic_groupby([]) == []
+
+        # objects in different buckets are never compared
+        labs = generic_groupby(
+            [1.0, 2.0, 1.05, 3.0, 2.02],
+            comp=lambda x, y: abs(x - y) < 0.1,
+            key=int,
+        )
+        assert labs == [0, 1, 0, 2, 1]
+
+    def test_get_length_groups(self):
+        # lengths on either side of a rounding boundary stay together
+        lengths = [1.2344999, 1.2345001]
+        length_groups = _get_length_groups(lengths)
+        assert length_groups == [0, 0]
+        labs = generic_groupby(
+            list(zip(lengths, length_groups)),
+            comp=lambda x, y: abs(x[0] - y[0]) <= 1e-3,
+            key=lambda x: x[1],
+        )
+        assert labs == [0, 0]
+
+        # groups are chained through neighbours closer than the tolerance
+        assert _get_length_groups([2.0, 1.0, 1.0008, 1.0016, 3.0]) == [1, 0, 0, 0, 2]
+        assert _get_length_groups([]) == []
+
+
 class MigrationGraphSimpleTest(unittest.TestCase):
     def setUp(self):
         struct = Structure.from_file(f"{dir_path}/full_path_files/MnO2_full_Li.vasp")
@@ -46,6 +79,9 @@ class MigrationGraphSimpleTest(unittest.TestCase):
         summary_dict = self.fpm.get_summary_dict()
         assert "hop_label" in summary_dict["hops"][0]
         assert "hop_label" in summary_dict["unique_hops"][0]
+        assert "iindex" in summary_dict["unique_hops"][0]
+        labels = [hop["hop_label"] for hop in summary_dict["unique_hops"]]
+        assert labels == sorted(labels)
 
 
 class MigrationGraphFromEntriesTest(unittest.TestCase):
@@ -317,6 +353,26 @@ class ChargeBarrierGraphTest(unittest.TestCase):
             3,
         )
 
+    def test_dist_mat(self):
+        dist_mat = self.cbg._dist_mat([0.1, 0.2, 0.3])
+        assert dist_mat.shape == self.cbg.potential_field.dim
+        self.assertAlmostEqual(dist_mat.min(), 0.02963, 4)
+
+    def test_get_avg_chg_at_max(self):
+        # sphere averages at a realistic radius
+        max_chg, avg_chg = self.cbg._get_avg_chg_at_max(
+            self.cbg.unique_hops[1]["hop"], radius=1.0, chg_along_path=True
+        )
+        self.assertAlmostEqual(max_chg, 0.16763, 4)
+        assert max_chg == max(avg_chg)
+
+        # the bounding box search finds the same points as the full distance matrix
+        center = [0.95, 0.02, 0.5]
+        ref = np.flatnonzero(self.cbg._dist_mat(center) < 1.0)
+        np.testing.assert_array_equal(
+            np.sort(self.cbg._get_grid_indices_in_sphere(center, 1.0)), ref
+        )
+
     def test_populate_edges_with_chg_density_info(self):
         """
         Test that all of the sites with similar lengths have similar charge densities,
@@ -336,6 +392,36 @@ class ChargeBarrierGraphTest(unittest.TestCase):
             if 1.05 > length / prv[0] > 0.95:
                 self.assertAlmostEqual(chg, prv[1], 3)
 
+    def test_populate_edges_with_chg_density_info_threads(self):
+        # the hops are analyzed in threads, compare a few of them against serial
+        self.cbg._tube_radius = 1
+        hops = [v["hop"] for v in list(self.cbg.unique_hops.values())[:3]]
+        chg_info_serial = [self.cbg._get_chg_info_of_hop(hop) for hop in hops]
+        chg_info_threads = Parallel(n_jobs=2, prefer="threads")(
+            delayed(self.cbg._get_chg_info_of_hop)(hop) for hop in hops
+        )
+        for serial, threads in zip(chg_info_serial, chg_info_threads):
+            chg_tot, max_chg, avg_chg_list, frac_coords_list = threads
+            assert serial[0] == chg_tot
+            assert serial[1] == max_chg
+            np.testing.assert_array_equal(serial[2], avg_chg_list)
+            np.testing.assert_array_equal(serial[3], frac_coords_list)
+
+    def test_get_least_chg_path(self):
+        # synthetic charges so that the charge analysis does not have to run
+        for k in self.cbg.unique_hops:
+            self.cbg.add_data_to_similar_edges(k, {"chg_total": (k * 7) % 5 + 1.0})
+        self.cbg.assign_cost_to_graph()
+
+        best_avg, best_labels = None, None
+        for _u, path in self.cbg.get_path():
+            avg = sum(h["chg_total"] for h in path) / sum(h["hop"].length for h in path)
+            if best_avg is None or avg < best_avg:
+                best_avg, best_labels = avg, [h["hop_label"] for h in path]
+
+        least_chg_path = self.cbg.get_least_chg_path()
+        assert [h["hop_label"] for h in least_chg_path] == best_labels
+
     def test_get_summary_dict(self):
         summary_dict = self.cbg.get_summary_dict()
         assert "chg_total", summary_dict["hops"][0]  # noqa: PLW0129
@@ -7,12 +7,15 @@ Functions for combining many ComputedEntry objects into MigrationGraph objects.
 from __future__ import annotations
 
 import logging
+from functools import lru_cache
 from typing import TYPE_CHECKING
 
 import numpy as np
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
 
 from pymatgen.analysis.structure_matcher import ElementComparator, StructureMatcher
-from pymatgen.core import Composition, Lattice, Structure
+from pymatgen.core import Composition, IStructure, Lattice, Structure
 from pymatgen.symmetry.analyzer import SpacegroupAnalyzer
 
 if TYPE_CHECKING:
@@ -78,16 +81,9 @@ def process_entries(
     )
 
     # grouping of inserted structures with base structures
-    all_sga = [
-        SpacegroupAnalyzer(
-            itr_base_ent.structure, symprec=symprec, angle_tolerance=angle_tol
-        )
-        for itr_base_ent in base_entries
-    ]
-
     entries_with_num_symmetry_ops = [
-        (ient, len(all_sga[itr_ent].get_space_group_operations()))
-        for itr_ent, ient in enumerate(base_entries)
+        (ient, len(_get_space_group_operations(ient.structure, symprec, angle_tol)))
+        for ient in base_entries
     ]
 
     entries_with_num_symmetry_ops = sorted(
@@ -117,12 +113,14 @@ def process_entries(
 
     for base_ent, _ in entries_with_num_symmetry_ops:
         # structure where the
-        mapped_cell = base_ent.structure.copy()
+        mapped_sites = list(base_ent.structure)
         for j_inserted in inserted_entries:
-            inserted_sites_ = _meta_stable_sites(base_ent, j_inserted)
-            mapped_cell.sites.extend(inserted_sites_)
+            mapped_sites.extend(_meta_stable_sites(base_ent, j_inserted))
 
-        struct_wo_sym_ops = _filter_and_merge(mapped_cell.get_sorted_structure())
+        # same as building the structure and calling get_sorted_structure
+        struct_wo_sym_ops = _filter_and_merge(
+            Structure.from_sites(sorted(mapped_sites))
+        )
         if struct_wo_sym_ops is None:
             logger.warning(
                 f"No meta-stable sites were found during symmetry mapping for base "
@@ -250,7 +248,6 @@ def get_sym_migration_ion_sites(
     """
     wi_ = migrating_ion
 
-    sa = SpacegroupAnalyzer(base_struct, symprec=symprec, angle_tolerance=angle_tol)
     # start with the base structure but empty
     sym_migration_ion_sites = list(
         filter(
@@ -260,24 +257,107 @@ def get_sym_migration_ion_sites(
     )
 
     sym_migration_struct = Structure.from_sites(sym_migration_ion_sites)
-    for op in sa.get_space_group_operations():
-        struct_tmp = sym_migration_struct.copy()
-        struct_tmp.apply_operation(symmop=op, fractional=True)
-        for isite in struct_tmp.sites:
-            if isite.species_string == wi_:
-                sym_migration_struct.insert(
-                    0,
-                    wi_,
-                    coords=np.mod(isite.frac_coords, 1.0),
-                    properties=isite.properties,
-                )
-
-            # must clean up as you go or the number of sites explodes
-            if len(sym_migration_struct) > 1:
-                sym_migration_struct.merge_sites(
-                    tol=SITE_MERGE_R, mode="average"
-                )  # keeps removing duplicates
-    return sym_migration_struct
+    ops = _get_space_group_operations(base_struct, symprec, angle_tol)
+    rotations = np.array([op.rotation_matrix for op in ops])
+    translations = np.array([op.translation_vector for op in ops])
+
+    # images of every site under every operation, in the same order as the ops
+    all_pos = np.einsum("oij,nj->oni", rotations, sym_migration_struct.frac_coords)
+    all_pos += translations[:, np.newaxis, :]
+    all_pos = all_pos.reshape(-1, 3)
+    all_pos %= 1.0
+
+    site_properties = {
+        k: v * len(ops) for k, v in sym_migration_struct.site_properties.items()
+    }
+    sym_migration_struct = Structure(
+        sym_migration_struct.lattice,
+        [wi_] * len(all_pos),
+        all_pos,
+        site_properties=site_properties,
+    )
+    return _merge_sites_average(sym_migration_struct, tol=SITE_MERGE_R)
+
+
+def _merge_sites_average(structure: Structure, tol: float) -> Structure:
+    """
+    Equivalent of structure.merge_sites(tol, mode="average") that works on arrays.
+    Sites closer than tol (with periodic images) are chained into clusters, each
+    cluster is replaced by one site at the periodic average of the positions. Float
+    properties are averaged, other properties are kept only if they agree.
+
+    Args:
+        structure: the structure to merge
+        tol: merging distance in Angstrom
+
+    Returns:
+        New structure with the merged sites, in order of the first site of each cluster
+    """
+    n_sites = len(structure)
+    # exact overlaps have zero distance, so self pairs must be kept
+    centers, points, _, _ = structure.get_neighbor_list(tol, exclude_self=False)
+    adjacency = coo_matrix(
+        (np.ones(len(centers)), (centers, points)), shape=(n_sites, n_sites)
+    )
+    n_clusters, labels = connected_components(adjacency, directed=False)
+    counts = np.bincount(labels, minlength=n_clusters)
+
+    frac_coords = structure.frac_coords
+    _, first = np.unique(labels, return_index=True)
+    offsets = frac_coords - frac_coords[first][labels]
+    offsets -= np.round(offsets)
+    mean_offsets = np.stack(
+        [np.bincount(labels, offsets[:, i], minlength=n_clusters) for i in range(3)],
+        axis=1,
+    )
+    new_coords = frac_coords[first] + mean_offsets / counts[:, np.newaxis]
+
+    site_properties = {}
+    for key, values in structure.site_properties.items():
+        if all(isinstance(val, float) for val in values):
+            totals = np.bincount(labels, values, minlength=n_clusters)
+            site_properties[key] = (totals / counts).tolist()
+            continue
+        merged = [values[i] for i in first]
+        for i, val in enumerate(values):
+            if merged[labels[i]] is not None and val != merged[labels[i]]:
+                merged[labels[i]] = None
+        site_properties[key] = merged
+
+    return Structure(
+        structure.lattice,
+        [structure.species[i] for i in first],
+        new_coords,
+        site_properties=site_properties,
+    )
+
+
+def _get_space_group_operations(
+    structure: Structure, symprec: float, angle_tol: float
+) -> tuple:
+    """
+    Get the space group operations of a structure, the symmetry analysis is cached
+    since the same base structure is analyzed repeatedly while processing entries.
+
+    Args:
+        structure: the structure to analyze
+        symprec: the symprec tolerance for the space group analysis
+        angle_tol: the angle tolerance for the space group analysis
+
+    Returns:
+        tuple of SymmOp objects in fractional coordinates
+    """
+    return _get_space_group_operations_cached(
+        IStructure.from_sites(structure), symprec, angle_tol
+    )
+
+
+@lru_cache(maxsize=32)
+def _get_space_group_operations_cached(
+    structure: IStructure, symprec: float, angle_tol: float
+) -> tuple:
+    sa = SpacegroupAnalyzer(structure, symprec=symprec, angle_tolerance=angle_tol)
+    return tuple(sa.get_space_group_operations())
 
 
 def _filter_and_merge(inserted_structure: Structure) -> Structure | None:
@@ -301,11 +381,14 @@ def _filter_and_merge(inserted_structure: Structure) -> Structure | None:
     migration = Structure.from_sites(migration_sites)
     base = Structure.from_sites(base_sites)
 
-    non_colliding_sites = []
-    for i_site in migration.sites:
-        col_sites = base.get_sites_in_sphere(i_site.coords, BASE_COLLISION_R)
-        if len(col_sites) == 0:
-            non_colliding_sites.append(i_site)
+    # distances from every migration site to the closest image of every base site
+    collides = (
+        migration.lattice.get_all_distances(migration.frac_coords, base.frac_coords)
+        < BASE_COLLISION_R
+    ).any(axis=1)
+    non_colliding_sites = [
+        i_site for i_site, i_col in zip(migration.sites, collides) if not i_col
+    ]
     res = Structure.from_sites(non_colliding_sites + base.sites)  # type: ignore
     res.merge_sites(tol=SITE_MERGE_R, mode="average")
     return res
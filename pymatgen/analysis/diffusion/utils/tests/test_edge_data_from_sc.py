@@ -7,7 +7,12 @@ import os
 import numpy as np
 import pytest
 
-from pymatgen.analysis.diffusion.neb.full_path_mapper import MigrationGraph
+from pymatgen.analysis.diffusion.neb.full_path_mapper import (
+    MigrationGraph,
+    MigrationHop,
+    map_hop_sc2uc,
+    map_hops_sc2uc,
+)
 from pymatgen.analysis.diffusion.utils.edge_data_from_sc import (
     add_edge_data_from_sc,
     get_uc_pos,
@@ -15,6 +20,7 @@ from pymatgen.analysis.diffusion.utils.edge_data_from_sc import (
 )
 from pymatgen.analysis.structure_matcher import StructureMatcher
 from pymatgen.core.structure import PeriodicSite, Structure
+from pymatgen.symmetry.analyzer import SpacegroupAnalyzer
 
 test_dir = os.path.dirname(os.path.realpath(__file__))
 
@@ -139,3 +145,32 @@ def test_get_unique_host_nonhost():
         "No symmetrically equivalent site was found for [0.53593472 "
         "2.8352428  4.54752366] Mg"
     )
+
+
+def test_map_hops_sc2uc():
+    # hops of a 2x2x2 supercell of the UC, translated by one UC along a
+    sc_ss = SpacegroupAnalyzer(
+        mg_Li.structure * [2, 2, 2], symprec=mg_Li.symprec
+    ).get_symmetrized_structure()
+    shift = np.array([1, 0, 0])
+    labels = sorted(mg_Li.unique_hops)[:3]
+    sc_hops = []
+    for label in labels:
+        uc_hop = mg_Li.unique_hops[label]["hop"]
+        isite, esite = (
+            PeriodicSite(site.specie, (site.frac_coords + shift) / 2, sc_ss.lattice)
+            for site in (uc_hop.isite, uc_hop.esite)
+        )
+        sc_hops.append(
+            MigrationHop(isite, esite, symm_structure=sc_ss, symprec=mg_Li.symprec)
+        )
+
+    serial = [map_hop_sc2uc(sc_hop, mg_Li) for sc_hop in sc_hops]
+    parallel = map_hops_sc2uc(sc_hops, mg_Li, n_jobs=2)
+    assert len(parallel) == len(serial)
+    for label, res_s, res_p in zip(labels, serial, parallel):
+        assert res_p["hop_label"] == res_s["hop_label"] == label
+        assert (res_p["uc_u"], res_p["uc_v"]) == (res_s["uc_u"], res_s["uc_v"])
+        assert res_p["hop"] is res_s["hop"]
+        assert res_p["flip"] == res_s["flip"]
+        np.testing.assert_array_equal(res_p["shift"], res_s["shift"])
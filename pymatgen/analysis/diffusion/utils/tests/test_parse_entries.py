@@ -10,6 +10,7 @@ from monty.serialization import loadfn
 
 from pymatgen.analysis.diffusion.utils.parse_entries import (
     _filter_and_merge,
+    _merge_sites_average,
     get_inserted_on_base,
     get_insertion_energy,
     get_sym_migration_ion_sites,
@@ -137,3 +138,18 @@ class ParseEntriesTest(unittest.TestCase):
             self.base.structure, self.inserted_2Li.structure, migrating_ion="Li"
         )
         assert struct22.composition["Li"] == 8
+
+    def test_merge_sites_average(self):
+        struct = Structure(
+            np.eye(3) * 5,
+            ["Li"] * 4,
+            [[0, 0, 0], [0.99, 0, 0], [0.5, 0.5, 0.5], [0.5, 0.5, 0.55]],
+            site_properties={"insertion_energy": [1.0, 2.0, 3.0, 4.0]},
+        )
+        ref = struct.copy()
+        ref.merge_sites(tol=1.0, mode="average")
+        merged = _merge_sites_average(struct, tol=1.0)
+        assert len(merged) == len(ref) == 2
+        for site in merged:
+            self.assertAlmostEqual(min(site.distance(r) for r in ref), 0)
+        assert merged.site_properties["insertion_energy"] == [1.5, 3.5]